@@ -0,0 +1,116 @@
+import asyncio
+import logging
+from . import crud, database, models, schemas
+
+logger = logging.getLogger(__name__)
+
+# --- Write Batching ---
+# Every commit on SQLite syncs the WAL to disk, and under write-heavy load that
+# sync dominates the latency of creating a todo. Instead of committing once per
+# request, create requests are queued and a single background task inserts them
+# in batches, committing once per batch.
+
+# Maximum number of todos inserted by a single commit.
+CREATE_BATCH_MAX_SIZE = 50
+# Maximum time (in seconds) the first queued todo waits for others to join its batch.
+CREATE_BATCH_MAX_WAIT = 0.005
+
+_create_queue: asyncio.Queue | None = None
+_worker_task: asyncio.Task | None = None
+
+
+async def create_todo(todo: schemas.TodoCreate) -> models.Todo:
+    """
+    Queues a ToDo item for creation and waits until its batch is committed.
+    Returns the created ToDo item, or raises the error that made its batch fail.
+    """
+    if not isinstance(todo, schemas.TodoCreate):
+        raise TypeError(f"Invalid todo object provided for creation: {type(todo)}. Expected schemas.TodoCreate.")
+    if _create_queue is None or _worker_task is None or _worker_task.done():
+        raise RuntimeError("The create batcher is not running.")
+
+    future = asyncio.get_running_loop().create_future()
+    await _create_queue.put((todo, future))
+    return await future
+
+
+async def start():
+    """
+    Starts the background task that commits queued creates.
+    Must be called from the running event loop (e.g. an application startup handler).
+    """
+    global _create_queue, _worker_task
+    if _worker_task is not None and not _worker_task.done():
+        return
+    _create_queue = asyncio.Queue()
+    _worker_task = asyncio.create_task(_run())
+    logger.info("Create batcher started.")
+
+
+async def stop():
+    """
+    Stops the background task. Creates still waiting in the queue are failed.
+    """
+    global _worker_task
+    if _worker_task is None:
+        return
+    _worker_task.cancel()
+    try:
+        await _worker_task
+    except asyncio.CancelledError:
+        pass
+    _worker_task = None
+
+    while not _create_queue.empty():
+        _, future = _create_queue.get_nowait()
+        if not future.done():
+            future.set_exception(RuntimeError("The create batcher was stopped."))
+    logger.info("Create batcher stopped.")
+
+
+async def _run():
+    """
+    Collects up to CREATE_BATCH_MAX_SIZE queued creates, waiting at most
+    CREATE_BATCH_MAX_WAIT after the first one, and commits them together.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await _create_queue.get()]
+        deadline = loop.time() + CREATE_BATCH_MAX_WAIT
+        while len(batch) < CREATE_BATCH_MAX_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(_create_queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        await _commit_batch(batch)
+
+
+async def _commit_batch(batch):
+    """
+    Inserts a batch of queued creates in one transaction and resolves their futures.
+    If the transaction fails, every create in the batch receives the error.
+    """
+    # Requests that were cancelled while waiting (e.g. client disconnected) are skipped.
+    batch = [(todo, future) for todo, future in batch if not future.done()]
+    if not batch:
+        return
+
+    logger.debug("Committing a batch of %s todos.", len(batch))
+    try:
+        async with database.SessionLocal() as db:
+            # One transaction and a single commit cover the whole batch;
+            # create_todos rolls back on failure and re-raises.
+            db_todos = await crud.create_todos(db, [todo for todo, _ in batch])
+    except Exception as e:
+        logger.exception("An unexpected error occurred while committing a batch of %s todos.", len(batch))
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(e)
+        return
+
+    for (_, future), db_todo in zip(batch, db_todos):
+        if not future.done():
+            future.set_result(db_todo)
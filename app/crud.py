@@ -1,173 +1,275 @@
 import logging
-from sqlalchemy.orm import Session
+from cachetools import TTLCache
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from . import models, schemas
-from pydantic import ValidationError # Import ValidationError for specific Pydantic errors
 
-# Configure logging
-# This basic configuration will log to the console.
-# In a real application, you would configure handlers for files, etc.
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+# Logging is configured once in main.py; this module only emits records.
 logger = logging.getLogger(__name__)
 
-def get_todo(db: Session, todo_id: int):
+# Maximum number of todos returned by a single page of stream_todos.
+MAX_LIMIT = 200
+
+# Maximum number of todos accepted by a single POST /todos/bulk request.
+MAX_BULK_CREATE = 1000
+
+# Number of rows fetched from the cursor per batch by stream_todos.
+STREAM_BATCH_SIZE = 50
+
+# Columns returned by stream_todos, in the field order of schemas.TodoInDB.
+TODO_LIST_COLUMNS = (models.Todo.title, models.Todo.description, models.Todo.id, models.Todo.completed, models.Todo.updated_at)
+
+# In-process cache of single todos looked up by get_todo, keyed by todo ID.
+# Entries are snapshots (schemas.TodoInDB), never ORM instances, so they are not
+# tied to the session that loaded them. update_todo and delete_todo invalidate
+# the entry after committing; the TTL bounds staleness when several worker
+# processes each keep their own cache.
+TODO_CACHE_MAX_SIZE = 10000
+TODO_CACHE_TTL_SECONDS = 60
+_todo_cache = TTLCache(maxsize=TODO_CACHE_MAX_SIZE, ttl=TODO_CACHE_TTL_SECONDS)
+# Bumped on every invalidation. get_todo only caches what it read if no
+# invalidation happened while its SELECT was in flight, so a read racing an
+# update cannot put the pre-update snapshot back into the cache.
+_todo_cache_generation = 0
+
+def _invalidate_todo(todo_id: int):
+    """
+    Drops a todo from the cache after it was changed or deleted.
+    """
+    global _todo_cache_generation
+    _todo_cache_generation += 1
+    _todo_cache.pop(todo_id, None)
+
+async def get_todo(db: AsyncSession, todo_id: int):
     """
     Retrieves a single ToDo item by its ID.
+    Returns a schemas.TodoInDB snapshot, served from the in-process cache when possible.
     """
-    logger.info(f"Attempting to retrieve todo with ID: {todo_id}")
-    try:
-        # Basic input validation for todo_id
-        # Ensure todo_id is an integer and positive to prevent invalid queries.
-        if not isinstance(todo_id, int) or todo_id <= 0:
-            logger.warning(f"Invalid todo_id provided: {todo_id}. Must be a positive integer.")
-            # Returning None for invalid input, consistent with "not found"
-            return None
-
-        db_todo = db.query(models.Todo).filter(models.Todo.id == todo_id).first()
-        if db_todo:
-            logger.info(f"Successfully retrieved todo with ID: {todo_id}")
-        else:
-            logger.warning(f"Todo with ID: {todo_id} not found.")
-        return db_todo
-    except Exception as e:
-        logger.exception(f"An unexpected error occurred while retrieving todo with ID {todo_id}.")
-        return None # Return None on error
-
-def get_todos(db: Session, skip: int = 0, limit: int = 100):
-    """
-    Retrieves a list of ToDo items with pagination.
-    """
-    logger.info(f"Attempting to retrieve todos with skip: {skip}, limit: {limit}")
-    try:
-        # Basic input validation for skip and limit
-        # Ensure skip is a non-negative integer.
-        if not isinstance(skip, int) or skip < 0:
-            logger.warning(f"Invalid skip value provided: {skip}. Must be a non-negative integer. Defaulting to 0.")
-            skip = 0 # Sanitize to default
-        
-        # Ensure limit is a positive integer.
-        if not isinstance(limit, int) or limit <= 0:
-            logger.warning(f"Invalid limit value provided: {limit}. Must be a positive integer. Defaulting to 100.")
-            limit = 100 # Sanitize to default
-        
-        # Enforce a reasonable maximum limit to prevent resource exhaustion attacks.
-        MAX_LIMIT = 200
-        if limit > MAX_LIMIT:
-            logger.warning(f"Requested limit {limit} exceeds maximum allowed ({MAX_LIMIT}). Setting to {MAX_LIMIT}.")
-            limit = MAX_LIMIT
-
-        todos = db.query(models.Todo).offset(skip).limit(limit).all()
-        logger.info(f"Successfully retrieved {len(todos)} todos.")
-        return todos
-    except Exception as e:
-        logger.exception(f"An unexpected error occurred while retrieving todos with skip {skip}, limit {limit}.")
-        return [] # Return empty list on error for consistency
-
-def create_todo(db: Session, todo: schemas.TodoCreate):
-    """
-    Creates a new ToDo item.
-    """
-    logger.info(f"Attempting to create a new todo.")
-    try:
-        # Pydantic models (schemas.TodoCreate) handle their own validation
-        # based on their defined types and constraints.
-        # If the input 'todo' object does not conform to schemas.TodoCreate,
-        # Pydantic will typically raise a ValidationError when it's instantiated
-        # or when .dict() is called.
-        if not isinstance(todo, schemas.TodoCreate):
-            logger.warning(f"Invalid todo object provided for creation: {type(todo)}. Expected schemas.TodoCreate.")
-            return None
-
-        # For XSS and other string-based security risks, it's recommended
-        # that string fields within schemas.TodoCreate (e.g., title, description)
-        # are validated/sanitized either within the Pydantic model definition
-        # (e.g., using regex patterns, custom validators) or at the API layer
-        # before passing the data to this function.
-        # This function assumes the Pydantic model has already performed
-        # necessary string validation/sanitization.
-        
-        db_todo = models.Todo(**todo.dict())
-        db.add(db_todo)
-        db.commit()
-        db.refresh(db_todo)
-        logger.info(f"Successfully created todo with ID: {db_todo.id}")
-        return db_todo
-    except ValidationError as e:
-        # Catch Pydantic validation errors specifically
-        logger.error(f"Input validation error during todo creation: {e.errors()}")
-        db.rollback() # Rollback any pending changes
-        return None
-    except Exception as e:
-        db.rollback() # Rollback in case of any other error during commit
-        logger.exception(f"An unexpected error occurred while creating a todo.")
+    logger.debug("Attempting to retrieve todo with ID: %s", todo_id)
+    # Basic input validation for todo_id
+    # Ensure todo_id is an integer and positive to prevent invalid queries.
+    if not isinstance(todo_id, int) or todo_id <= 0:
+        logger.warning("Invalid todo_id provided: %s. Must be a positive integer.", todo_id)
+        # Returning None for invalid input, consistent with "not found"
         return None
 
-def update_todo(db: Session, todo_id: int, todo: schemas.TodoUpdate):
+    cached = _todo_cache.get(todo_id)
+    if cached is not None:
+        logger.debug("Retrieved todo with ID: %s from cache.", todo_id)
+        return cached
+
+    # Session.get() consults the identity map first, so repeated lookups of
+    # the same todo within a session do not emit another SELECT.
+    # Database errors propagate to the caller (the API layer maps them to 500).
+    generation = _todo_cache_generation
+    db_todo = await db.get(models.Todo, todo_id)
+    if db_todo:
+        logger.debug("Successfully retrieved todo with ID: %s", todo_id)
+        cached = schemas.TodoInDB.model_validate(db_todo)
+        if generation == _todo_cache_generation:
+            _todo_cache[todo_id] = cached
+        return cached
+    logger.warning("Todo with ID: %s not found.", todo_id)
+    return None
+
+def _sanitize_page_params(after_id, limit):
     """
-    Updates an existing ToDo item.
+    Validates keyset pagination parameters, replacing invalid values with defaults.
+    Returns the (after_id, limit) pair to use.
+    """
+    # Basic input validation for after_id
+    # Ensure after_id, when given, is a non-negative integer.
+    if after_id is not None and (not isinstance(after_id, int) or after_id < 0):
+        logger.warning("Invalid after_id value provided: %s. Must be a non-negative integer. Starting from the first page.", after_id)
+        after_id = None # Sanitize to default
+    
+    # Ensure limit is a positive integer.
+    if not isinstance(limit, int) or limit <= 0:
+        logger.warning("Invalid limit value provided: %s. Must be a positive integer. Defaulting to 100.", limit)
+        limit = 100 # Sanitize to default
+    
+    # Enforce a reasonable maximum limit to prevent resource exhaustion attacks.
+    if limit > MAX_LIMIT:
+        logger.warning("Requested limit %s exceeds maximum allowed (%s). Setting to %s.", limit, MAX_LIMIT, MAX_LIMIT)
+        limit = MAX_LIMIT
+    return after_id, limit
+
+def _todo_page_stmt(after_id, limit, *columns, until_id=None):
+    """
+    Builds the keyset pagination SELECT of 'columns' for one page of todos.
+    If 'until_id' is given, the page also stops at that ID (inclusive).
+    """
+    stmt = select(*columns)
+    if after_id is not None:
+        stmt = stmt.where(models.Todo.id > after_id)
+    if until_id is not None:
+        stmt = stmt.where(models.Todo.id <= until_id)
+    return stmt.order_by(models.Todo.id).limit(limit)
+
+async def stream_todos(db: AsyncSession, after_id: int | None = None, limit: int = 100, until_id: int | None = None):
+    """
+    Streams a page of ToDo items using keyset (seek) pagination, in batches.
+    Only items with an ID greater than 'after_id' are returned, ordered by ID,
+    so each page is served by a range scan on the primary key index instead of
+    scanning and discarding rows as OFFSET does.
+    Pass the cursor from get_next_todo_cursor as 'until_id' so the page ends
+    exactly where the next page starts, even if rows were deleted in between.
+    Yields lists of at most STREAM_BATCH_SIZE Row tuples of TODO_LIST_COLUMNS,
+    fetched from the cursor with yield_per so only one batch is held in memory.
+    Errors are propagated, since the caller may already have sent part of the page.
+    """
+    logger.debug("Attempting to stream todos with after_id: %s, limit: %s, until_id: %s", after_id, limit, until_id)
+    after_id, limit = _sanitize_page_params(after_id, limit)
+    # Selecting plain columns returns lightweight Row tuples instead of
+    # hydrating and identity-mapping a Todo instance per row.
+    stmt = _todo_page_stmt(after_id, limit, *TODO_LIST_COLUMNS, until_id=until_id).execution_options(yield_per=STREAM_BATCH_SIZE)
+    result = await db.stream(stmt)
+    async for rows in result.partitions():
+        yield rows
+
+async def get_next_todo_cursor(db: AsyncSession, after_id: int | None = None, limit: int = 100):
+    """
+    Returns the 'after_id' cursor of the page following the given one, or None
+    if the given page is not full (i.e. it is the last page).
+    Only reads the primary key index, so it can be answered before a streamed
+    page is sent and used in its response headers. It runs before (and in a
+    different session from) the stream, so the stream must be bounded by it
+    through stream_todos(until_id=...) to keep pages from overlapping.
+    """
+    after_id, limit = _sanitize_page_params(after_id, limit)
+    # The last ID of a full page is the row at position 'limit' of the page.
+    stmt = _todo_page_stmt(after_id, limit, models.Todo.id).offset(limit - 1).limit(1)
+    return (await db.execute(stmt)).scalar_one_or_none()
+
+async def create_todos(db: AsyncSession, todos: list[schemas.TodoCreate]):
+    """
+    Creates several ToDo items in one transaction.
+    This is the only create path: POST /todos/bulk calls it directly, and
+    POST /todos/ reaches it through the batches committed by app.batching.
+    Uses an ORM bulk INSERT (the 2.0 form of Session.bulk_insert_mappings), which
+    skips per-object unit-of-work bookkeeping, and sends all rows in a single
+    multi-row INSERT ... RETURNING. Returns the created ToDo items in input order.
+    Database errors are re-raised after rolling back so the caller can report them.
     """
-    logger.info(f"Attempting to update todo with ID: {todo_id}.")
+    logger.debug("Attempting to create %s todos.", len(todos))
+    if not todos:
+        return []
+
+    mappings = [{"title": todo.title, "description": todo.description} for todo in todos]
     try:
-        # Basic input validation for todo_id
-        if not isinstance(todo_id, int) or todo_id <= 0:
-            logger.warning(f"Invalid todo_id provided for update: {todo_id}. Must be a positive integer.")
-            return None
-
-        # Pydantic model validation is handled by the model itself.
-        if not isinstance(todo, schemas.TodoUpdate):
-            logger.warning(f"Invalid todo object provided for update: {type(todo)}. Expected schemas.TodoUpdate.")
-            return None
-
-        db_todo = get_todo(db, todo_id) # This call is already wrapped with logging/error handling
-        if not db_todo:
-            logger.warning(f"Todo with ID: {todo_id} not found for update.")
-            return None
-
-        # Similar to create_todo, XSS and other string-based validation
-        # should ideally be handled within the Pydantic model definition
-        # or at the API layer.
-        update_data = todo.dict(exclude_unset=True)
-        if not update_data:
-            logger.info(f"No fields provided for update for todo ID: {todo_id}. No changes made.")
-            return db_todo # Return original if no updates requested
-
-        for field, value in update_data.items():
-            setattr(db_todo, field, value)
-            logger.debug(f"Updating field '{field}' to '{value}' for todo ID: {todo_id}")
-
-        db.commit()
-        db.refresh(db_todo)
-        logger.info(f"Successfully updated todo with ID: {todo_id}.")
-        return db_todo
-    except ValidationError as e:
-        logger.error(f"Input validation error during todo update for ID {todo_id}: {e.errors()}")
-        db.rollback()
+        # render_nulls keeps a None description in the INSERT instead of leaving
+        # the column out, so every row has the same columns and the whole batch
+        # goes out as one multi-row INSERT.
+        stmt = insert(models.Todo).returning(models.Todo).execution_options(render_nulls=True)
+        result = await db.scalars(stmt, mappings)
+        # A multi-row RETURNING does not guarantee row order, but SQLite (a
+        # single writer) assigns increasing IDs in VALUES order, so sorting by
+        # ID restores the input order.
+        db_todos = sorted(result.all(), key=lambda db_todo: db_todo.id)
+        await db.commit()
+    except Exception:
+        await db.rollback() # Rollback in case of any error during insert or commit
+        logger.exception("An unexpected error occurred while creating %s todos.", len(todos))
+        raise
+    logger.debug("Successfully created %s todos.", len(db_todos))
+    return db_todos
+
+async def update_todo(db: AsyncSession, todo_id: int, todo: schemas.TodoUpdate):
+    """
+    Updates an existing ToDo item.
+    """
+    logger.debug("Attempting to update todo with ID: %s.", todo_id)
+    # Basic input validation for todo_id
+    if not isinstance(todo_id, int) or todo_id <= 0:
+        logger.warning("Invalid todo_id provided for update: %s. Must be a positive integer.", todo_id)
+        return None
+
+    # Pydantic model validation is handled by the model itself.
+    if not isinstance(todo, schemas.TodoUpdate):
+        logger.warning("Invalid todo object provided for update: %s. Expected schemas.TodoUpdate.", type(todo))
         return None
-    except Exception as e:
-        db.rollback() # Rollback in case of any other error during commit
-        logger.exception(f"An unexpected error occurred while updating todo with ID {todo_id}.")
+
+    # Similar to create_todos, XSS and other string-based validation
+    # should ideally be handled within the Pydantic model definition
+    # or at the API layer.
+    # Only the fields the client actually sent are updated; reading them
+    # from model_fields_set avoids serializing the whole model. They are taken
+    # in declaration order so the same set of fields always builds the same
+    # statement (and hits the same compiled-statement cache entry).
+    update_data = {field: getattr(todo, field) for field in schemas.TodoUpdate.model_fields if field in todo.model_fields_set}
+    if not update_data:
+        logger.debug("No fields provided for update for todo ID: %s. No changes made.", todo_id)
+        return await get_todo(db, todo_id) # Return original (or None if missing) if no updates requested
+
+    logger.debug("Updating fields %s for todo ID: %s", list(update_data), todo_id)
+
+    # A single UPDATE ... RETURNING replaces the SELECT, the unit-of-work
+    # flush and the post-commit refresh. No returned row means no todo with
+    # this ID exists.
+    stmt = (
+        update(models.Todo)
+        .where(models.Todo.id == todo_id)
+        .values(**update_data)
+        .returning(models.Todo)
+    )
+    try:
+        result = await db.execute(stmt)
+        db_todo = result.scalar_one_or_none()
+        await db.commit()
+    except Exception:
+        await db.rollback() # Rollback in case of any error during update or commit
+        logger.exception("An unexpected error occurred while updating todo with ID %s.", todo_id)
+        raise
+    _invalidate_todo(todo_id)
+    if not db_todo:
+        logger.warning("Todo with ID: %s not found for update.", todo_id)
         return None
 
-def delete_todo(db: Session, todo_id: int):
+    logger.debug("Successfully updated todo with ID: %s.", todo_id)
+    return db_todo
+
+async def delete_todo(db: AsyncSession, todo_id: int):
     """
     Deletes a ToDo item.
+    Returns True if a todo was deleted, False if it did not exist.
     """
-    logger.info(f"Attempting to delete todo with ID: {todo_id}.")
+    logger.debug("Attempting to delete todo with ID: %s.", todo_id)
+    # Basic input validation for todo_id
+    if not isinstance(todo_id, int) or todo_id <= 0:
+        logger.warning("Invalid todo_id provided for deletion: %s. Must be a positive integer.", todo_id)
+        return False
+
+    # A single DELETE by primary key; the row is never loaded, and the
+    # affected row count tells whether the todo existed.
+    stmt = delete(models.Todo).where(models.Todo.id == todo_id).execution_options(synchronize_session=False)
     try:
-        # Basic input validation for todo_id
-        if not isinstance(todo_id, int) or todo_id <= 0:
-            logger.warning(f"Invalid todo_id provided for deletion: {todo_id}. Must be a positive integer.")
-            return None
-
-        db_todo = get_todo(db, todo_id) # This call is already wrapped with logging/error handling
-        if not db_todo:
-            logger.warning(f"Todo with ID: {todo_id} not found for deletion.")
-            return None
-
-        db.delete(db_todo)
-        db.commit()
-        logger.info(f"Successfully deleted todo with ID: {todo_id}.")
-        return db_todo
-    except Exception as e:
-        db.rollback() # Rollback in case of any error during commit
-        logger.exception(f"An unexpected error occurred while deleting todo with ID {todo_id}.")
-        return None
\ No newline at end of file
+        result = await db.execute(stmt)
+        await db.commit()
+    except Exception:
+        await db.rollback() # Rollback in case of any error during delete or commit
+        logger.exception("An unexpected error occurred while deleting todo with ID %s.", todo_id)
+        raise
+    _invalidate_todo(todo_id)
+    if result.rowcount == 0:
+        logger.warning("Todo with ID: %s not found for deletion.", todo_id)
+        return False
+
+    logger.debug("Successfully deleted todo with ID: %s.", todo_id)
+    return True
+
+async def warm_up_statement_cache(db: AsyncSession):
+    """
+    Executes the read statements the CRUD functions use once, so SQLAlchemy
+    compiles them and stores them in its compiled-statement cache before the
+    first request. The statements are built exactly as the CRUD functions build
+    them (values such as IDs and limits are bound parameters and do not affect
+    the cache key). Write statements are left to compile on first use, so
+    starting a worker never takes SQLite's write lock.
+    """
+    logger.debug("Warming up the SQLAlchemy statement cache.")
+    await db.get(models.Todo, 0)
+    for after_id in (None, 0):
+        await get_next_todo_cursor(db, after_id, 1)
+        for until_id in (None, 0):
+            async for _ in stream_todos(db, after_id, 1, until_id):
+                pass
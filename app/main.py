@@ -1,51 +1,107 @@
+import hashlib
 import logging
-from fastapi import FastAPI, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+import orjson
+from contextlib import asynccontextmanager
+from typing import Annotated
+from fastapi import Body, FastAPI, Depends, HTTPException, Request, Response, status
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 
-# Assuming . import database, models, schemas, crud are available and correctly set up
-from . import database, models, schemas, crud
-
 # --- Logging Configuration ---
-# Configure logging at the top of the file
+# This is the only place logging is configured; the other modules just use
+# logging.getLogger(__name__). Per-request messages are logged at DEBUG, so
+# they are filtered out (without being formatted) at the default INFO level.
+# It runs before the app modules are imported so their import-time messages are kept.
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Assuming . import database, models, schemas, crud are available and correctly set up
+from . import batching, database, models, schemas, crud
+
 # --- Database Initialization ---
-# 初始化資料庫
-try:
-    models.Base.metadata.create_all(bind=database.engine)
-    logger.info("Database tables created or already exist.")
-except SQLAlchemyError as e:
-    logger.critical(f"Failed to initialize database due to SQLAlchemy error: {e}", exc_info=True)
-    # In a production environment, you might want to exit the application if DB init fails critically
-    # import sys; sys.exit(1)
-except Exception as e:
-    logger.critical(f"An unexpected error occurred during database initialization: {e}", exc_info=True)
-    # import sys; sys.exit(1)
-
-app = FastAPI(title="Todo List API")
+# Columns added to the Todo model after its first version, with their SQL types.
+ADDED_TODO_COLUMNS = {"updated_at": "DATETIME"}
+# Indexes that earlier versions of the Todo model declared but no longer exist.
+OBSOLETE_TODO_INDEXES = ("ix_todos_title",)
 
-# 取得 DB session
-def get_db():
-    db = database.SessionLocal()
+def _upgrade_todo_table(conn):
+    existing_columns = {column["name"] for column in inspect(conn).get_columns(models.Todo.__tablename__)}
+    for column_name, column_type in ADDED_TODO_COLUMNS.items():
+        if column_name not in existing_columns:
+            conn.execute(text(f"ALTER TABLE {models.Todo.__tablename__} ADD COLUMN {column_name} {column_type}"))
+    for index_name in OBSOLETE_TODO_INDEXES:
+        conn.execute(text(f"DROP INDEX IF EXISTS {index_name}"))
+    for index in models.Todo.__table__.indexes:
+        index.create(conn, checkfirst=True)
+
+# 初始化資料庫
+async def init_db():
     try:
-        logger.debug("Attempting to get database session.")
-        yield db
+        async with database.engine.begin() as conn:
+            await conn.run_sync(models.Base.metadata.create_all)
+            # create_all does not alter tables that already exist, so bring the
+            # columns and indexes of databases created by earlier versions up to date.
+            await conn.run_sync(_upgrade_todo_table)
+        logger.info("Database tables created or already exist.")
     except SQLAlchemyError as e:
-        logger.error(f"Database error during session yield: {e}", exc_info=True)
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Database connection error.")
+        logger.critical("Failed to initialize database due to SQLAlchemy error: %s", e, exc_info=True)
+        # In a production environment, you might want to exit the application if DB init fails critically
+        # import sys; sys.exit(1)
+    except Exception as e:
+        logger.critical("An unexpected error occurred during database initialization: %s", e, exc_info=True)
+        # import sys; sys.exit(1)
+
+# Compile the common statements before the first request arrives.
+# Runs after init_db so the tables already exist.
+async def warm_up_statement_cache():
+    try:
+        async with database.SessionLocal() as db:
+            await crud.warm_up_statement_cache(db)
+        logger.info("SQLAlchemy statement cache warmed up.")
     except Exception as e:
-        logger.error(f"An unexpected error occurred during database session yield: {e}", exc_info=True)
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="An unexpected error occurred while managing database session.")
+        # Only first-request latency is affected, so startup continues.
+        logger.warning("Failed to warm up the SQLAlchemy statement cache: %s", e, exc_info=True)
+
+# --- Application Lifespan ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await init_db()
+    await warm_up_statement_cache()
+    # Creates are committed in batches by a background task living on the app's event loop.
+    await batching.start()
+    try:
+        yield
     finally:
-        logger.debug("Closing database session.")
-        db.close()
+        await batching.stop()
+
+# Responses are encoded with orjson instead of the stdlib json module.
+# ORJSONResponse is deprecated (but still works) from FastAPI 0.131.
+app = FastAPI(title="Todo List API", default_response_class=ORJSONResponse, lifespan=lifespan)
+
+# 取得 DB session
+async def get_db():
+    async with database.SessionLocal() as db:
+        try:
+            logger.debug("Attempting to get database session.")
+            yield db
+        except (HTTPException, RequestValidationError): # Let 404s and 422s raised by the endpoint pass through unchanged
+            raise
+        except SQLAlchemyError as e:
+            logger.error("Database error during session yield: %s", e, exc_info=True)
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Database connection error.")
+        except Exception as e:
+            logger.error("An unexpected error occurred during database session yield: %s", e, exc_info=True)
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="An unexpected error occurred while managing database session.")
+        finally:
+            logger.debug("Closing database session.")
 
 # 建立 Todo
 @app.post("/todos/", response_model=schemas.TodoInDB)
-def create_todo(todo: schemas.TodoCreate, db: Session = Depends(get_db)):
-    logger.info(f"Received request to create todo: {todo.title}")
+async def create_todo(todo: schemas.TodoCreate):
+    logger.debug("Received request to create todo: %s", todo.title)
     # Input validation: FastAPI and Pydantic automatically handle type validation
     # for 'todo' (schemas.TodoCreate). If the input data does not conform to the
     # schema (e.g., wrong types, missing required fields), FastAPI will return
@@ -55,100 +111,182 @@ def create_todo(todo: schemas.TodoCreate, db: Session = Depends(get_db)):
     # If storing sanitized data is a strict requirement, a library like 'bleach'
     # could be used here, but it would alter the original input data.
     try:
-        db_todo = crud.create_todo(db, todo)
-        logger.info(f"Successfully created todo with ID: {db_todo.id}")
+        # The create is queued and committed together with other concurrent creates.
+        db_todo = await batching.create_todo(todo)
+        logger.debug("Successfully created todo with ID: %s", db_todo.id)
         return db_todo
     except IntegrityError as e:
-        logger.error(f"Integrity error when creating todo (e.g., duplicate entry): {e}", exc_info=True)
+        logger.error("Integrity error when creating todo (e.g., duplicate entry): %s", e, exc_info=True)
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="A todo with similar details might already exist or a database constraint was violated.")
     except SQLAlchemyError as e:
-        logger.error(f"Database error when creating todo: {e}", exc_info=True)
+        logger.error("Database error when creating todo: %s", e, exc_info=True)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Database operation failed during todo creation.")
     except Exception as e:
-        logger.error(f"An unexpected error occurred while creating todo: {e}", exc_info=True)
+        logger.error("An unexpected error occurred while creating todo: %s", e, exc_info=True)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="An unexpected error occurred.")
+
+# 批次建立 Todo
+@app.post("/todos/bulk", response_model=list[schemas.TodoInDB])
+async def create_todos(todos: Annotated[list[schemas.TodoCreate], Body(max_length=crud.MAX_BULK_CREATE)], db: AsyncSession = Depends(get_db)):
+    logger.debug("Received request to create %s todos.", len(todos))
+    # Input validation: every item is validated against schemas.TodoCreate,
+    # so a single invalid item rejects the whole request with a 422, as does
+    # a list longer than crud.MAX_BULK_CREATE.
+    try:
+        db_todos = await crud.create_todos(db, todos)
+        logger.debug("Successfully created %s todos.", len(db_todos))
+        return db_todos
+    except IntegrityError as e:
+        logger.error("Integrity error when creating todos in bulk: %s", e, exc_info=True)
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="A database constraint was violated while creating the todos.")
+    except SQLAlchemyError as e:
+        logger.error("Database error when creating todos in bulk: %s", e, exc_info=True)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Database operation failed during bulk todo creation.")
+    except Exception as e:
+        logger.error("An unexpected error occurred while creating todos in bulk: %s", e, exc_info=True)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="An unexpected error occurred.")
 
 # 讀取多筆 Todo
+async def _stream_todos_json(after_id: int | None, limit: int, until_id: int | None):
+    """
+    Yields a page of todos as a JSON array, encoding each batch with orjson as
+    soon as it is fetched. Uses its own session because the body is sent after
+    the endpoint (and its get_db session) has returned.
+    """
+    yield b"["
+    first = True
+    try:
+        async with database.SessionLocal() as db:
+            async for rows in crud.stream_todos(db, after_id, limit, until_id):
+                chunk = b",".join(orjson.dumps(row._asdict()) for row in rows)
+                yield chunk if first else b"," + chunk
+                first = False
+    except Exception as e:
+        # The status line is already sent, so the error cannot change it.
+        # Re-raising without the closing bracket aborts the response, so the
+        # client sees an incomplete body instead of a page that looks complete.
+        logger.error("An unexpected error occurred while streaming todos: %s", e, exc_info=True)
+        raise
+    yield b"]"
+
+# The page is streamed in batches; response_model only documents the shape.
 @app.get("/todos/", response_model=list[schemas.TodoInDB])
-def read_todos(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    logger.info(f"Received request to read todos with skip={skip}, limit={limit}")
-    # Input validation: FastAPI automatically validates 'skip' and 'limit' as integers.
+async def read_todos(request: Request, after_id: int | None = None, limit: int = 100, db: AsyncSession = Depends(get_db)):
+    logger.debug("Received request to read todos with after_id=%s, limit=%s", after_id, limit)
+    # Input validation: FastAPI automatically validates 'after_id' and 'limit' as integers.
     # If they are not integers, FastAPI returns a 422 Unprocessable Entity.
     try:
-        todos = crud.get_todos(db, skip, limit)
-        logger.info(f"Successfully retrieved {len(todos)} todos.")
-        return todos
+        headers = {}
+        # A full page means there may be more rows; expose the last ID as the
+        # cursor for the next page through a standard 'Link' header. Headers go
+        # out before the body, so the cursor is looked up before streaming and
+        # the streamed page is then cut off at it, keeping pages from overlapping.
+        next_cursor = await crud.get_next_todo_cursor(db, after_id, limit)
+        # The body streams from its own session after this endpoint returns, so
+        # return this one's connection to the pool now instead of holding two.
+        await db.close()
+        if next_cursor is not None:
+            next_url = request.url.include_query_params(after_id=next_cursor)
+            headers["Link"] = f'<{next_url}>; rel="next"'
+        return StreamingResponse(_stream_todos_json(after_id, limit, next_cursor), media_type="application/json", headers=headers)
     except SQLAlchemyError as e:
-        logger.error(f"Database error when reading todos: {e}", exc_info=True)
+        logger.error("Database error when reading todos: %s", e, exc_info=True)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Database operation failed during todo retrieval.")
     except Exception as e:
-        logger.error(f"An unexpected error occurred while reading todos: {e}", exc_info=True)
+        logger.error("An unexpected error occurred while reading todos: %s", e, exc_info=True)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="An unexpected error occurred.")
 
 # 讀取單筆 Todo
+def _todo_etag(todo) -> str:
+    """
+    Returns the (quoted) ETag of a todo, derived from its ID and last update time.
+    """
+    digest = hashlib.blake2b(f"{todo.id}:{todo.updated_at}".encode(), digest_size=8).hexdigest()
+    return f'"{digest}"'
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Returns True if an If-None-Match header value matches 'etag' (weak comparison).
+    """
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
 @app.get("/todos/{todo_id}", response_model=schemas.TodoInDB)
-def read_todo(todo_id: int, db: Session = Depends(get_db)):
-    logger.info(f"Received request to read todo with ID: {todo_id}")
+async def read_todo(todo_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_db)):
+    logger.debug("Received request to read todo with ID: %s", todo_id)
     # Input validation: FastAPI automatically validates 'todo_id' as an integer.
     # If it's not an integer, FastAPI returns a 422 Unprocessable Entity.
     try:
-        db_todo = crud.get_todo(db, todo_id)
+        db_todo = await crud.get_todo(db, todo_id)
         if not db_todo:
-            logger.warning(f"Todo with ID {todo_id} not found.")
+            logger.warning("Todo with ID %s not found.", todo_id)
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Todo not found")
-        logger.info(f"Successfully retrieved todo with ID: {todo_id}")
+        # Clients revalidate with If-None-Match; an unchanged todo is answered
+        # with 304 and no body, skipping serialization entirely.
+        etag = _todo_etag(db_todo)
+        cache_headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            logger.debug("Todo with ID: %s not modified.", todo_id)
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers)
+        response.headers.update(cache_headers)
+        logger.debug("Successfully retrieved todo with ID: %s", todo_id)
         return db_todo
     except HTTPException: # Re-raise FastAPI's own HTTPExceptions (like 404)
         raise
     except SQLAlchemyError as e:
-        logger.error(f"Database error when reading todo ID {todo_id}: {e}", exc_info=True)
+        logger.error("Database error when reading todo ID %s: %s", todo_id, e, exc_info=True)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Database operation failed during single todo retrieval.")
     except Exception as e:
-        logger.error(f"An unexpected error occurred while reading todo ID {todo_id}: {e}", exc_info=True)
+        logger.error("An unexpected error occurred while reading todo ID %s: %s", todo_id, e, exc_info=True)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="An unexpected error occurred.")
 
 # 更新 Todo
 @app.put("/todos/{todo_id}", response_model=schemas.TodoInDB)
-def update_todo(todo_id: int, todo: schemas.TodoUpdate, db: Session = Depends(get_db)):
-    logger.info(f"Received request to update todo with ID: {todo_id}")
+async def update_todo(todo_id: int, todo: schemas.TodoUpdate, db: AsyncSession = Depends(get_db)):
+    logger.debug("Received request to update todo with ID: %s", todo_id)
     # Input validation: FastAPI validates 'todo_id' as an integer and 'todo'
     # against schemas.TodoUpdate.
     try:
-        updated = crud.update_todo(db, todo_id, todo)
+        updated = await crud.update_todo(db, todo_id, todo)
         if not updated:
-            logger.warning(f"Todo with ID {todo_id} not found for update.")
+            logger.warning("Todo with ID %s not found for update.", todo_id)
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Todo not found")
-        logger.info(f"Successfully updated todo with ID: {todo_id}")
+        logger.debug("Successfully updated todo with ID: %s", todo_id)
         return updated
     except HTTPException: # Re-raise FastAPI's own HTTPExceptions (like 404)
         raise
     except IntegrityError as e:
-        logger.error(f"Integrity error when updating todo ID {todo_id}: {e}", exc_info=True)
+        logger.error("Integrity error when updating todo ID %s: %s", todo_id, e, exc_info=True)
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Update would violate a unique constraint.")
     except SQLAlchemyError as e:
-        logger.error(f"Database error when updating todo ID {todo_id}: {e}", exc_info=True)
+        logger.error("Database error when updating todo ID %s: %s", todo_id, e, exc_info=True)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Database operation failed during todo update.")
     except Exception as e:
-        logger.error(f"An unexpected error occurred while updating todo ID {todo_id}: {e}", exc_info=True)
+        logger.error("An unexpected error occurred while updating todo ID %s: %s", todo_id, e, exc_info=True)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="An unexpected error occurred.")
 
 # 刪除 Todo
-@app.delete("/todos/{todo_id}", response_model=schemas.TodoInDB)
-def delete_todo(todo_id: int, db: Session = Depends(get_db)):
-    logger.info(f"Received request to delete todo with ID: {todo_id}")
+@app.delete("/todos/{todo_id}", response_model=schemas.TodoDeleted)
+async def delete_todo(todo_id: int, db: AsyncSession = Depends(get_db)):
+    logger.debug("Received request to delete todo with ID: %s", todo_id)
     # Input validation: FastAPI validates 'todo_id' as an integer.
     try:
-        deleted = crud.delete_todo(db, todo_id)
+        deleted = await crud.delete_todo(db, todo_id)
         if not deleted:
-            logger.warning(f"Todo with ID {todo_id} not found for deletion.")
+            logger.warning("Todo with ID %s not found for deletion.", todo_id)
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Todo not found")
-        logger.info(f"Successfully deleted todo with ID: {todo_id}")
-        return deleted
+        logger.debug("Successfully deleted todo with ID: %s", todo_id)
+        return {"deleted": True}
     except HTTPException: # Re-raise FastAPI's own HTTPExceptions (like 404)
         raise
     except SQLAlchemyError as e:
-        logger.error(f"Database error when deleting todo ID {todo_id}: {e}", exc_info=True)
+        logger.error("Database error when deleting todo ID %s: %s", todo_id, e, exc_info=True)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Database operation failed during todo deletion.")
     except Exception as e:
-        logger.error(f"An unexpected error occurred while deleting todo ID {todo_id}: {e}", exc_info=True)
+        logger.error("An unexpected error occurred while deleting todo ID %s: %s", todo_id, e, exc_info=True)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="An unexpected error occurred.")
\ No newline at end of file
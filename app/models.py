@@ -1,9 +1,9 @@
 import logging
-from sqlalchemy import Column, Integer, String, Boolean
+from datetime import datetime, timezone
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Index
 from .database import Base
 
-# Configure logging for this module
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# Logging is configured once in main.py; this module only emits records.
 logger = logging.getLogger(__name__)
 
 # --- Input Validation Note ---
@@ -22,22 +22,38 @@ logger = logging.getLogger(__name__)
 # is first received and processed.
 # --- End Input Validation Note ---
 
+def _utcnow():
+    """
+    Returns the current UTC time as a naive datetime (SQLite stores no timezone).
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
 try:
     logger.info("Attempting to define the Todo model class.")
 
     class Todo(Base):
         __tablename__ = "todos"
+        __table_args__ = (
+            # Supports listing todos filtered by completion status with keyset
+            # pagination on id as a single index range scan.
+            Index("ix_todos_completed_id", "completed", "id"),
+        )
 
         id = Column(Integer, primary_key=True, index=True)
-        title = Column(String, index=True)
+        # No index on title: no query filters or sorts by it, and the index would
+        # only add B-tree maintenance to every insert and update.
+        title = Column(String)
         description = Column(String, nullable=True)
         completed = Column(Boolean, default=False)
+        # Set on insert and on every UPDATE statement (including Core update()).
+        # Used to derive the ETag of a todo.
+        updated_at = Column(DateTime, default=_utcnow, onupdate=_utcnow, nullable=True)
 
     logger.info("Todo model class defined successfully.")
 
 except Exception as e:
     # Catch any exceptions that might occur during class definition (e.g., issues with imports, syntax errors)
-    logger.critical(f"Failed to define the Todo model class: {e}", exc_info=True)
+    logger.critical("Failed to define the Todo model class: %s", e, exc_info=True)
     # Depending on the application, you might want to re-raise the exception or handle it gracefully
     # For a critical error like this, re-raising might be appropriate to prevent the application from starting incorrectly.
     raise # Re-raise the exception after logging it
\ No newline at end of file